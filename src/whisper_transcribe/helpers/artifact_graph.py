@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+from rich.console import Console
+from rich.theme import Theme
+
+custom_theme = Theme(
+        {"success": "grey3 on pale_green1 bold", "error": "grey93 on red bold"}
+        )
+
+console = Console(highlight=True, emoji=True, theme=custom_theme, emoji_variant="emoji")
+
+FINGERPRINT_SUFFIX = ".fingerprint"
+
+
+def get_fingerprint_path(artifact_path: Path) -> Path:
+    """Get the path of the fingerprint file stored next to an artifact.
+
+    Args:
+        artifact_path (Path): The path to the artifact.
+
+    Returns:
+        Path: The artifact path with the fingerprint suffix appended.
+    """
+    artifact_path = Path(artifact_path)
+    return artifact_path.with_name(artifact_path.name + FINGERPRINT_SUFFIX)
+
+
+@contextmanager
+def atomic_write(file_path: Path, encoding: str = "utf-8"):
+    """Open a temporary file next to ``file_path`` that replaces it only once it is written completely.
+
+    Args:
+        file_path (Path): The path to the file to write.
+        encoding (str, optional): The encoding of the file. Defaults to 'utf-8'.
+
+    Yields:
+        file: The temporary file opened for writing text.
+    """
+    file_path = Path(file_path)
+    temp_path = file_path.with_name(file_path.name + ".tmp")
+    try:
+        with open(temp_path, "w", encoding=encoding) as file:
+            yield file
+        os.replace(temp_path, file_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+def hash_file(file_path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        while block := file.read(1024 * 1024):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def hash_params(params) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Artifact:
+    """A file in the artifact graph.
+
+    Sources (``build`` is None) are only read, all other artifacts are rebuilt by calling ``build``
+    whenever they are stale.
+    """
+
+    def __init__(self, name: str, path: Path, build=None, inputs=(), params=None, version: str = "1",
+                 adopt_existing: bool = False):
+        self.name = name
+        self.path = Path(path)
+        self.build = build
+        self.inputs = list(inputs)
+        self.params = params or {}
+        self.version = str(version)
+        self.adopt_existing = adopt_existing
+
+    @property
+    def is_source(self) -> bool:
+        return self.build is None
+
+    @property
+    def fingerprint_path(self) -> Path:
+        return get_fingerprint_path(self.path)
+
+    def __repr__(self):
+        return f"Artifact(name={self.name!r}, path={self.path.name!r}, inputs={self.inputs!r})"
+
+
+class ArtifactGraph:
+    """Output files declared as a dependency graph, rebuilt only when they are stale.
+
+    Every built artifact gets a fingerprint file next to it, holding the content hashes of its inputs
+    and of itself, and a fingerprint of the parameters it was built with. An artifact is stale when it
+    or its fingerprint is missing, when its version or parameters changed, or when the content of an
+    input or of the artifact itself differs from the recorded one.
+
+    Artifacts declared with ``adopt_existing`` are expensive to rebuild: if they exist without a fingerprint,
+    e.g. because they were created before fingerprints were introduced, the current state is recorded
+    instead of rebuilding them.
+    """
+
+    def __init__(self):
+        self.artifacts = {}
+        self._file_states = {}
+
+    def __contains__(self, name):
+        return name in self.artifacts
+
+    def __getitem__(self, name) -> Artifact:
+        return self.artifacts[name]
+
+    def add_source(self, name: str, path: Path) -> Artifact:
+        return self.add(name, path)
+
+    def add(self, name: str, path: Path, build=None, inputs=(), params=None, version: str = "1",
+            adopt_existing: bool = False) -> Artifact:
+        """Declare an artifact. Its inputs have to be declared before, which keeps the graph in topological order.
+
+        Args:
+            name (str): The unique name of the artifact.
+            path (Path): The file the artifact is stored in.
+            build (callable, optional): Writes the artifact to ``path``. None for source files.
+            inputs (iterable, optional): The names of the artifacts it is built from.
+            params (dict, optional): The parameters it is built with, for the fingerprint.
+            version (str, optional): Bump it when the code building the artifact changes.
+            adopt_existing (bool, optional): Record an existing file without fingerprint instead of rebuilding it.
+
+        Returns:
+            Artifact: The declared artifact.
+        """
+        if name in self.artifacts:
+            raise ValueError(f"Artifact {name!r} is already declared")
+        for input_name in inputs:
+            if input_name not in self.artifacts:
+                raise ValueError(f"Input {input_name!r} of artifact {name!r} is not declared")
+        artifact = Artifact(name, path, build=build, inputs=inputs, params=params, version=version,
+                            adopt_existing=adopt_existing)
+        self.artifacts[name] = artifact
+        return artifact
+
+    def _file_state(self, file_path: Path, recorded_state: dict = None) -> dict:
+        # the content is only hashed again if size or modification time differ from the recorded state
+        stat = Path(file_path).stat()
+        state = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if recorded_state and all(recorded_state.get(key) == value for key, value in state.items()):
+            return recorded_state
+        cache_key = (str(file_path), stat.st_size, stat.st_mtime_ns)
+        if cache_key not in self._file_states:
+            self._file_states[cache_key] = {"sha256": hash_file(file_path), **state}
+        return self._file_states[cache_key]
+
+    def read_fingerprint(self, name: str):
+        try:
+            with open(self.artifacts[name].fingerprint_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def create_fingerprint(self, name: str, recorded_fingerprint: dict = None) -> dict:
+        artifact = self.artifacts[name]
+        recorded_fingerprint = recorded_fingerprint or {}
+        recorded_inputs = recorded_fingerprint.get("inputs", {})
+        return {
+            "version": artifact.version,
+            "params": hash_params(artifact.params),
+            "inputs": {
+                input_name: self._file_state(self.artifacts[input_name].path, recorded_inputs.get(input_name))
+                for input_name in artifact.inputs
+                },
+            "output": self._file_state(artifact.path, recorded_fingerprint.get("output")),
+            }
+
+    def is_stale(self, name: str) -> bool:
+        artifact = self.artifacts[name]
+        if artifact.is_source:
+            return False
+        if not artifact.path.exists():
+            return True
+        recorded_fingerprint = self.read_fingerprint(name)
+        if recorded_fingerprint is None:
+            return True
+        try:
+            current_fingerprint = self.create_fingerprint(name, recorded_fingerprint)
+        except OSError:
+            return True
+        if current_fingerprint["inputs"].keys() != recorded_fingerprint.get("inputs", {}).keys():
+            return True
+        if current_fingerprint["version"] != recorded_fingerprint.get("version"):
+            return True
+        if current_fingerprint["params"] != recorded_fingerprint.get("params"):
+            return True
+        if current_fingerprint["output"]["sha256"] != recorded_fingerprint.get("output", {}).get("sha256"):
+            return True
+        return any(state["sha256"] != recorded_fingerprint["inputs"][input_name].get("sha256")
+                   for input_name, state in current_fingerprint["inputs"].items())
+
+    def is_adoptable(self, name: str) -> bool:
+        artifact = self.artifacts[name]
+        return artifact.adopt_existing and artifact.path.exists() and not artifact.fingerprint_path.exists()
+
+    def record(self, name: str) -> None:
+        """Write the fingerprint of an artifact that was just built."""
+        fingerprint = self.create_fingerprint(name)
+        with atomic_write(self.artifacts[name].fingerprint_path) as file:
+            json.dump(fingerprint, file, indent=4, sort_keys=True)
+
+    def build(self, name: str) -> None:
+        """Build an artifact and record its fingerprint. The build has to raise if it fails."""
+        artifact = self.artifacts[name]
+        artifact.build()
+        self._file_states = {key: state for key, state in self._file_states.items() if key[0] != str(artifact.path)}
+        if not artifact.path.exists():
+            raise FileNotFoundError(f"Building artifact {name!r} did not create {artifact.path}")
+        self.record(name)
+
+    def get_dependencies(self, targets=None) -> list:
+        """Get the names of the targets and all artifacts they depend on, in topological order."""
+        if targets is None:
+            return list(self.artifacts)
+        needed = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.artifacts[name].inputs)
+        return [name for name in self.artifacts if name in needed]
+
+    def update(self, targets=None, force: bool = False, status=None) -> list:
+        """Rebuild the stale artifacts needed for the targets.
+
+        Args:
+            targets (iterable, optional): The names of the artifacts to update. Defaults to all artifacts.
+            force (bool, optional): Rebuild the targets even if they are up to date. Their dependencies
+                are only rebuilt if they are stale.
+            status (Status, optional): A rich status to report the progress to.
+
+        Returns:
+            list: The names of the rebuilt artifacts.
+        """
+        rebuilt = []
+        forced = set(self.artifacts if targets is None else targets) if force else set()
+        for name in self.get_dependencies(targets):
+            artifact = self.artifacts[name]
+            if artifact.is_source:
+                continue
+            if name not in forced and self.is_adoptable(name):
+                console.print(f"Adopting existing {artifact.path.name}")
+                self.record(name)
+                continue
+            if name not in forced and not self.is_stale(name):
+                continue
+            if status is not None:
+                status.update(f"Building {artifact.path.name}...")
+            self.build(name)
+            rebuilt.append(name)
+        skipped = [name for name in self.get_dependencies(targets)
+                   if name not in rebuilt and not self.artifacts[name].is_source]
+        if skipped:
+            console.print(f"Up to date: {', '.join(skipped)}")
+        return rebuilt
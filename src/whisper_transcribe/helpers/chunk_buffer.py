@@ -0,0 +1,63 @@
+import io
+import tempfile
+
+# parts up to this size stay in memory, bigger ones are spilled to a temporary file
+DEFAULT_SPILL_THRESHOLD = 16_000_000
+
+
+class ChunkBuffer:
+    """An encoded audio part, held in memory and spilled to disk above ``spill_threshold`` bytes.
+
+    Use it as a context manager (or call ``close``) to free the buffer. The split is transcribed one part at
+    a time and every buffer is closed right after its upload, so a job never holds more than one part and
+    at most ``spill_threshold`` bytes of it in memory.
+    """
+
+    def __init__(self, name: str, spill_threshold: int = DEFAULT_SPILL_THRESHOLD):
+        self.name = name
+        self.size = 0
+        self._file = tempfile.SpooledTemporaryFile(max_size=spill_threshold, suffix=f"_{name}")
+
+    @classmethod
+    def from_audio_segment(cls, audio_segment, name: str, audio_format: str = "mp3", **kwargs):
+        """Encode a pydub AudioSegment into a new chunk buffer.
+
+        Args:
+            audio_segment (AudioSegment): The audio to encode.
+            name (str): The file name used for the upload, including the extension.
+            audio_format (str, optional): The format to encode the audio in. Defaults to 'mp3'.
+
+        Returns:
+            ChunkBuffer: The buffer holding the encoded audio.
+        """
+        buffer = cls(name, **kwargs)
+        try:
+            audio_segment.export(buffer._file, format=audio_format)
+            # pydub rewinds the file after exporting, so measure from the end
+            buffer.size = buffer._file.seek(0, io.SEEK_END)
+            buffer._file.seek(0)
+        except BaseException:
+            buffer.close()
+            raise
+        return buffer
+
+    @property
+    def spilled(self) -> bool:
+        return bool(getattr(self._file, "_rolled", False))
+
+    def as_upload(self):
+        """Return a ``(file name, file object)`` tuple that can be passed to the transcription call."""
+        self._file.seek(0)
+        return self.name, self._file
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"ChunkBuffer(name={self.name!r}, size={self.size}, spilled={self.spilled})"
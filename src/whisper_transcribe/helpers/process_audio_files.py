@@ -1,5 +1,4 @@
 import sys
-import tempfile
 from pathlib import Path
 
 from pydub import AudioSegment
@@ -7,6 +6,7 @@ from pydub.silence import split_on_silence
 from rich.console import Console
 from rich.theme import Theme
 
+from .chunk_buffer import DEFAULT_SPILL_THRESHOLD, ChunkBuffer
 from .time_calculations import seconds_to_milliseconds
 
 custom_theme = Theme(
@@ -16,19 +16,37 @@ custom_theme = Theme(
 console = Console(highlight=True, emoji=True, theme=custom_theme, emoji_variant="emoji")
 
 
-def split_audio_file(audio_segment, current_status, base_file_name):
-    audio_parts = []
+# the parameters the audio is split with, also used to fingerprint the split
+SPLIT_PARAMETERS = {
+    "min_silence_len": 500,
+    "silence_thresh": -16,
+    "keep_silence": True,
+    "seek_step": 5,
+    # the parts are at least 8 minutes long
+    "target_length": 480_000,
+    }
 
+
+def merge_audio_chunks(audio_segment, current_status):
+    """Split the audio on silence and recombine the chunks into parts of at least ``target_length`` ms.
+
+    Args:
+        audio_segment (AudioSegment): The audio to split.
+        current_status (Status): A rich status to report the progress to.
+
+    Returns:
+        list: The audio parts as AudioSegments.
+    """
     chunks = split_on_silence(audio_segment,
-                              min_silence_len=500,
-                              silence_thresh=-16,
-                              keep_silence=True,
-                              seek_step=5
+                              min_silence_len=SPLIT_PARAMETERS["min_silence_len"],
+                              silence_thresh=SPLIT_PARAMETERS["silence_thresh"],
+                              keep_silence=SPLIT_PARAMETERS["keep_silence"],
+                              seek_step=SPLIT_PARAMETERS["seek_step"]
                               )
 
     console.print(f"Chunks length is {len(chunks)}")
     # now recombine the chunks so that the parts are at least 8 Minutes long
-    target_length = 480_000
+    target_length = SPLIT_PARAMETERS["target_length"]
     output_chunks = [chunks[0]]
     current_status.update("Merging Chunks...")
     for chunk in chunks[1:]:
@@ -38,15 +56,16 @@ def split_audio_file(audio_segment, current_status, base_file_name):
             # if the last output chunk is longer than the target length,
             # we can start a new one
             output_chunks.append(chunk)
+    return output_chunks
 
-    for i, chunk in enumerate(output_chunks):
-        current_status.update(f"Saving audio chunk {i + 1}/{len(output_chunks)}...")
-        with tempfile.NamedTemporaryFile(suffix=".mp3", prefix=f"{base_file_name}_part{i}_", delete=False) as temp_audio_file:
-            chunk.export(temp_audio_file, format="mp3")
-            console.print(f"Saved part to: {temp_audio_file.name}")
-            audio_parts.append(temp_audio_file.name)
 
-    return audio_parts
+def buffer_audio_chunk(chunk, base_file_name, part_number, spill_threshold=DEFAULT_SPILL_THRESHOLD):
+    audio_part = ChunkBuffer.from_audio_segment(chunk,
+                                                f"{base_file_name}_part{part_number}.mp3",
+                                                spill_threshold=spill_threshold,
+                                                )
+    console.print(f"Buffered part: {audio_part!r}")
+    return audio_part
 
 
 def calculate_chunk_seek_steps(audio_segment: AudioSegment, max_chunk_size=20_000_000):
@@ -8,3 +8,11 @@ def seconds_to_milliseconds(seconds: float) -> float:
 
 def minutes_to_milliseconds(minutes: float) -> float:
     return seconds_to_milliseconds(minutes * 60)
+
+
+def seconds_to_timestamp(seconds: float) -> str:
+    # round first, so 59.9996 seconds become 00:01:00.000 and not 00:00:60.000
+    seconds, milliseconds = divmod(round(seconds * 1000), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}"
@@ -0,0 +1,288 @@
+import json
+import re
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import List
+
+from rich.console import Console
+from rich.prompt import Prompt
+from rich.status import Status
+from rich.table import Table
+from rich.theme import Theme
+
+from .time_calculations import seconds_to_timestamp
+
+custom_theme = Theme(
+        {"success": "grey3 on pale_green1 bold", "error": "grey93 on red bold"}
+        )
+
+console = Console(highlight=True, emoji=True, theme=custom_theme, emoji_variant="emoji")
+
+INDEX_FILE_NAME = "transcript_index.sqlite3"
+# the index is only a cache of the word files, so it is rebuilt from scratch when the schema changes
+SCHEMA_VERSION = 2
+# the word files of split audio are saved as <episode>__<part>.json
+PART_FILE_PATTERN = re.compile(r"^(?P<episode>.+)__(?P<part>\d+)$")
+
+# the python tokenizer has to split words like the fts5 unicode61 tokenizer, see tokenize()
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    episode TEXT NOT NULL,
+    offset REAL NOT NULL,
+    words TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS transcript_text USING fts5(text, tokenize = 'unicode61 remove_diacritics 0');
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    """Split the text into lowercase tokens, the same way the index does.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list: The tokens of the text.
+    """
+    return re.findall(r"[^\W_]+", text.lower())
+
+
+def open_index(index_path: Path) -> sqlite3.Connection:
+    connection = sqlite3.connect(index_path)
+    if connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        connection.executescript("DROP TABLE IF EXISTS transcripts; DROP TABLE IF EXISTS transcript_text;")
+        connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def get_episode_and_offset(file_path: Path):
+    """Get the episode a word file belongs to and the start of its part within the episode.
+
+    The word times of a part count from the start of the part, so the lengths of the previous parts,
+    as recorded in ``<episode>_parts.json``, are added to them.
+
+    Args:
+        file_path (Path): The path to the word file.
+
+    Returns:
+        tuple: The name of the episode and the offset of the part in seconds.
+    """
+    match = PART_FILE_PATTERN.match(file_path.stem)
+    if match is None:
+        return file_path.stem, 0.0
+    episode, part_number = match["episode"], int(match["part"])
+    try:
+        with open(file_path.with_name(f"{episode}_parts.json"), "r", encoding="utf-8") as file:
+            part_lengths_ms = json.load(file)["part_lengths_ms"]
+        return episode, sum(part_lengths_ms[:part_number]) / 1000
+    except (OSError, ValueError, KeyError, TypeError):
+        console.print(f"No part lengths found for {file_path.name}, its times start at the part", style='error')
+        return episode, 0.0
+
+
+def read_word_file(file_path: Path):
+    """Read a ``<name>.json`` file with the word timestamps of a transcript.
+
+    Args:
+        file_path (Path): The path to the json file.
+
+    Returns:
+        list: ``[word, start, end]`` for every word, or None if the file holds no word timestamps.
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            content = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(content, list) or not all(isinstance(item, dict) and {"word", "start", "end"} <= item.keys()
+                                                for item in content):
+        return None
+    return [[item["word"], item["start"], item["end"]] for item in content]
+
+
+def find_word_files(folder: Path) -> List[Path]:
+    # the full transcripts and the parts files are json as well, but hold no word list
+    return [file_path for file_path in Path(folder).rglob("*.json")
+            if not re.search(r"_full_transcript(_\d+)?$|_parts$", file_path.stem)]
+
+
+def update_index(index_path: Path, file_paths, status=None) -> int:
+    """Add new and changed word files to the index.
+
+    Files with the same size, modification time and part offset as the indexed ones are skipped without
+    reading them.
+
+    Args:
+        index_path (Path): The path to the index database.
+        file_paths (iterable): The word files to index.
+        status (Status, optional): A rich status to report the progress to.
+
+    Returns:
+        int: The number of indexed files.
+    """
+    indexed = 0
+    with closing(open_index(index_path)) as connection, connection:
+        for file_path in file_paths:
+            file_path = Path(file_path).resolve()
+            stat = file_path.stat()
+            episode, offset = get_episode_and_offset(file_path)
+            row = connection.execute("SELECT id, size, mtime_ns, offset FROM transcripts WHERE path = ?",
+                                     (str(file_path),)
+                                     ).fetchone()
+            if row is not None and row[1:] == (stat.st_size, stat.st_mtime_ns, offset):
+                continue
+            if status is not None:
+                status.update(f"Indexing {file_path.name}...")
+            if row is not None:
+                connection.execute("DELETE FROM transcript_text WHERE rowid = ?", (row[0],))
+            # files without word timestamps are stored with an empty word list, so they are skipped next time
+            words = read_word_file(file_path) or []
+            transcript_id = connection.execute(
+                    "INSERT INTO transcripts (path, size, mtime_ns, episode, offset, words) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                    "episode = excluded.episode, offset = excluded.offset, words = excluded.words RETURNING id",
+                    (str(file_path), stat.st_size, stat.st_mtime_ns, episode, offset,
+                     json.dumps(words, ensure_ascii=False)),
+                    ).fetchone()[0]
+            if words:
+                connection.execute("INSERT INTO transcript_text (rowid, text) VALUES (?, ?)",
+                                   (transcript_id, " ".join(word for word, start, end in words)),
+                                   )
+                indexed += 1
+    return indexed
+
+
+def remove_missing_files(index_path: Path) -> int:
+    removed = 0
+    with closing(open_index(index_path)) as connection, connection:
+        for transcript_id, path in connection.execute("SELECT id, path FROM transcripts").fetchall():
+            if not Path(path).exists():
+                connection.execute("DELETE FROM transcript_text WHERE rowid = ?", (transcript_id,))
+                connection.execute("DELETE FROM transcripts WHERE id = ?", (transcript_id,))
+                removed += 1
+    return removed
+
+
+def find_index(folder: Path):
+    """Find the index a folder belongs to, in the folder itself or in one of its parents.
+
+    Args:
+        folder (Path): The folder with the transcripts.
+
+    Returns:
+        Path: The path to the index database, or None if the folder is not indexed.
+    """
+    folder = Path(folder).resolve()
+    return next((parent / INDEX_FILE_NAME for parent in [folder, *folder.parents]
+                 if (parent / INDEX_FILE_NAME).exists()), None)
+
+
+def update_index_from_folder(folder: Path, status=None):
+    """Bring the index in the folder up to date with the word files in it and its subfolders.
+
+    Args:
+        folder (Path): The folder with the transcripts. The index is stored in it as ``INDEX_FILE_NAME``.
+        status (Status, optional): A rich status to report the progress to.
+
+    Returns:
+        tuple: The number of indexed and of removed files.
+    """
+    index_path = Path(folder) / INDEX_FILE_NAME
+    indexed = update_index(index_path, find_word_files(folder), status=status)
+    removed = remove_missing_files(index_path)
+    return indexed, removed
+
+
+def find_phrase(words, tokens: List[str]):
+    """Find the positions of the token sequence in the words of a transcript.
+
+    Args:
+        words (list): ``[word, start, end]`` for every word.
+        tokens (list): The tokens of the phrase.
+
+    Yields:
+        tuple: The index of the first and of the last word of every match.
+    """
+    word_tokens = [(token, i) for i, (word, start, end) in enumerate(words) for token in tokenize(word)]
+    for position in range(len(word_tokens) - len(tokens) + 1):
+        if all(word_tokens[position + offset][0] == token for offset, token in enumerate(tokens)):
+            yield word_tokens[position][1], word_tokens[position + len(tokens) - 1][1]
+
+
+def search_index(index_path: Path, phrase: str, context_words: int = 8, limit: int = 50) -> List[dict]:
+    """Search a phrase across all indexed transcripts.
+
+    Args:
+        index_path (Path): The path to the index database.
+        phrase (str): The phrase to search for.
+        context_words (int, optional): The number of words to show around every hit. Defaults to 8.
+        limit (int, optional): The maximum number of hits. Defaults to 50.
+
+    Returns:
+        list: A dict with the file, the episode, the start and end time in seconds within the episode and the
+            context for every hit.
+    """
+    tokens = tokenize(phrase)
+    if not tokens:
+        return []
+    hits = []
+    with closing(open_index(index_path)) as connection:
+        rows = connection.execute(
+                "SELECT transcripts.path, transcripts.episode, transcripts.offset, transcripts.words "
+                "FROM transcript_text "
+                "JOIN transcripts ON transcripts.id = transcript_text.rowid "
+                "WHERE transcript_text MATCH ? ORDER BY rank",
+                (f'"{" ".join(tokens)}"',),
+                )
+        for path, episode, offset, words_json in rows:
+            words = json.loads(words_json)
+            for first, last in find_phrase(words, tokens):
+                hits.append({
+                    "file": Path(path),
+                    "episode": episode,
+                    "start": words[first][1] + offset,
+                    "end": words[last][2] + offset,
+                    "context": " ".join(word for word, start, end in
+                                        words[max(first - context_words, 0):last + context_words + 1]),
+                    })
+                if len(hits) >= limit:
+                    return hits
+    return hits
+
+
+def print_hits(hits: List[dict]) -> None:
+    table = Table("Episode", "Start", "End", "Context")
+    for hit in hits:
+        table.add_row(hit["episode"],
+                      seconds_to_timestamp(hit["start"]),
+                      seconds_to_timestamp(hit["end"]),
+                      hit["context"],
+                      )
+    console.print(table)
+
+
+def main() -> None:
+    """Update the index of a transcript folder and answer phrase queries until an empty one is entered."""
+    folder = Path(Prompt.ask("Enter the folder with your transcripts").strip('"'))
+    with Status("Updating transcript index...") as current_status:
+        indexed, removed = update_index_from_folder(folder, status=current_status)
+    console.print(f"Indexed {indexed} new or changed transcripts, removed {removed} missing ones.")
+
+    index_path = folder / INDEX_FILE_NAME
+    while phrase := Prompt.ask("Search for (leave empty to quit)", default=""):
+        start_time = time.perf_counter()
+        hits = search_index(index_path, phrase)
+        duration = (time.perf_counter() - start_time) * 1000
+        print_hits(hits)
+        console.print(f"Found {len(hits)} hits in {duration:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
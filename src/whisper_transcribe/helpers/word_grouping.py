@@ -14,12 +14,17 @@ from rich.console import Console
 from rich.theme import Theme
 from srt import Subtitle
 
+from .artifact_graph import atomic_write
+
 custom_theme = Theme(
     {"success": "grey3 on pale_green1 bold", "error": "grey93 on red bold"}
 )
 
 console = Console(highlight=True, emoji=True, theme=custom_theme, emoji_variant="emoji")
 
+# bump when the grouping logic changes, so existing _more_words.srt files are rebuilt
+WORD_GROUPING_VERSION = 1
+
 
 def read_file(file_path: Path) -> str:
     """Read a file and return its contents as a string.
@@ -245,7 +250,7 @@ def save_new_srt_file(new_srt_list: List[Subtitle], new_save_path: Path) -> None
     Args:
         new_srt_list (list): A list of SRT subtitle objects.
     """
-    with open(new_save_path, "w", encoding="utf-8") as file:
+    with atomic_write(new_save_path) as file:
         file.write(srt.compose(new_srt_list))
 
 
@@ -267,10 +272,12 @@ def main(text_file_path: Path, json_file_path: Path, **kwargs) -> None:
     output_folder = get_save_path(json_file_path)
     # srt_list = build_srt(json_data)
     tokenized_text_sentences = tokenize_text(text_data, 'german')
-    status.update("Building new SRT file...")
+    if status is not None:
+        status.update("Building new SRT file...")
     srt_sentences = build_srt_with_sentences(json_data, tokenized_text_sentences.tokens)
     new_srt_data = build_new_srt(srt_sentences)
-    status.update("Saving new SRT file...")
+    if status is not None:
+        status.update("Saving new SRT file...")
     new_file_path = get_new_file_path_to_save(text_file_path, "more_words", ".srt")
     save_new_srt_file(new_srt_data, new_file_path)
 
@@ -3,7 +3,9 @@ import os
 import subprocess
 import sys
 import winreg
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from functools import partial
 from pathlib import Path
 
 import emoji
@@ -15,13 +17,17 @@ from openai.types.audio import Transcription
 from pathvalidate import sanitize_filename
 from pytube import Stream, YouTube
 from rich.console import Console
-from rich.prompt import Prompt
+from rich.prompt import Confirm, Prompt
 from rich.status import Status
 from rich.theme import Theme
 from srt import Subtitle
 
-from .helpers.process_audio_files import get_file_size, get_pydub_audio_segment, split_audio_file
-from .helpers.word_grouping import main as word_grouping
+from .helpers.artifact_graph import ArtifactGraph, atomic_write
+from .helpers.chunk_buffer import DEFAULT_SPILL_THRESHOLD
+from .helpers.process_audio_files import (SPLIT_PARAMETERS, buffer_audio_chunk, get_file_size, get_pydub_audio_segment,
+                                          merge_audio_chunks)
+from .helpers.transcript_index import find_index, update_index
+from .helpers.word_grouping import WORD_GROUPING_VERSION, main as word_grouping
 
 custom_theme = Theme(
         {"success": "grey3 on pale_green1 bold", "error": "grey93 on red bold"}
@@ -29,6 +35,10 @@ custom_theme = Theme(
 
 console = Console(highlight=True, emoji=True, theme=custom_theme, emoji_variant="emoji")
 
+TRANSCRIPTION_MODEL = "whisper-1"
+# bump when the srt generation changes, so existing srt files are rebuilt
+SRT_VERSION = 1
+
 
 def main():
     file_path = Prompt.ask("Enter an audio filepath or an URL to a youtube video. ")
@@ -39,12 +49,24 @@ def main():
         with Status("Getting Audio from Link...") as current_status:
             audio_file_path = get_audio_from_link(file_path, current_status)
 
-    run_script(file_path=Path(audio_file_path), language=language)
+    force_transcription = False
+    if has_transcript(Path(audio_file_path)):
+        force_transcription = Confirm.ask("A transcript of this audio already exists. Transcribe it again?",
+                                          default=False,
+                                          )
+
+    run_script(file_path=Path(audio_file_path), language=language, force_transcription=force_transcription)
 
     console.print("I'm done for now. Bye 👋")
     subprocess.Popen(rf'explorer /select,{audio_file_path.parent}')
 
 
+def has_transcript(audio_file_path: Path):
+    # the first part is enough to tell for split audio files
+    return any(create_all_filenames(audio_file_path, part_number).get('full_json_file').exists()
+               for part_number in ['', '_0'])
+
+
 def get_save_path(audio_file_path, save_path=None):
     # audio_bytes = read_audio_file(audio_file)
     if save_path is None:
@@ -61,7 +83,8 @@ def check_file_exists(file):
         return False
 
 
-def run_script(file_path: Path, language, save_path: Path = None, ):
+def run_script(file_path: Path, language, save_path: Path = None, force_transcription=False,
+               spill_threshold=DEFAULT_SPILL_THRESHOLD, ):
 
     with Status("Generating new File Name...") as current_status:
         save_path = get_save_path(file_path, save_path)
@@ -70,67 +93,265 @@ def run_script(file_path: Path, language, save_path: Path = None, ):
                 )
         suffix = file_path.suffix
         file_size = get_file_size(file_path)
-        raw_transcript = Path(all_filenames.get('raw_transcript_file')).with_suffix('.txt')
 
     if file_size > 23_000_000:
-        with Status("File size is greater than 20 MB...") as current_status:
-            transcript_part = []
-            audio_segment = get_pydub_audio_segment(file_path)
-            current_status.update("Splitting Audio Segment...")
-            audio_parts = split_audio_file(audio_segment, current_status, all_filenames.get('base_file_name'))
-        for i, audio_part in enumerate(audio_parts):
+        run_split_script(file_path, language, all_filenames, force_transcription, spill_threshold)
+    else:
+        graph = ArtifactGraph()
+        graph.add_source("audio", file_path)
+        graph.add("transcript",
+                  all_filenames.get('full_json_file'),
+                  build=partial(transcribe_to_file, file_path, language, all_filenames),
+                  inputs=["audio"],
+                  params=get_transcription_params(language),
+                  adopt_existing=True,
+                  )
+        graph.update(force=force_transcription)
+        try:
+            with Status("Updating transcript files...") as current_status:
+                post_process_transcript(all_filenames, status=current_status)
+        except Exception as e:
+            console.log(e, style='error')
+        add_to_transcript_index(file_path.parent, [all_filenames.get('json_file')])
+
+
+def run_split_script(file_path: Path, language, all_filenames, force_transcription=False,
+                     spill_threshold=DEFAULT_SPILL_THRESHOLD):
+    audio_chunks = []
+
+    def get_audio_chunks():
+        # the audio is only decoded and split if a part has to be transcribed
+        if not audio_chunks:
+            with Status("File size is greater than 20 MB...") as current_status:
+                audio_segment = get_pydub_audio_segment(file_path)
+                current_status.update("Splitting Audio Segment...")
+                audio_chunks.extend(merge_audio_chunks(audio_segment, current_status))
+        return audio_chunks
+
+    def save_parts_file():
+        # any change to the part boundaries changes this file and so invalidates the part transcripts
+        save_json({
+            "parts": len(get_audio_chunks()),
+            "part_lengths_ms": [len(audio_chunk) for audio_chunk in get_audio_chunks()],
+            "split_parameters": SPLIT_PARAMETERS,
+            }, parts_file)
+
+    def transcribe_part(part_number, part_filenames):
+        audio_chunk = get_audio_chunks()[part_number]
+        with buffer_audio_chunk(audio_chunk,
+                                all_filenames.get('base_file_name'),
+                                part_number,
+                                spill_threshold=spill_threshold,
+                                ) as audio_part:
+            transcribe_to_file(audio_part.as_upload(), language, part_filenames)
+
+    parts_file = generate_file_name(file_path, additional_text="parts", suffix=".json")
+    full_text_file = generate_file_name(file_path,
+                                        additional_text="raw_transcript_full_text_from_all_parts",
+                                        suffix=".txt",
+                                        )
+    if not parts_file.exists():
+        save_parts_file_from_transcripts(file_path, parts_file)
+    graph = ArtifactGraph()
+    graph.add_source("audio", file_path)
+    graph.add("parts",
+              parts_file,
+              build=save_parts_file,
+              inputs=["audio"],
+              params=SPLIT_PARAMETERS,
+              adopt_existing=True,
+              )
+    graph.update(["parts"])
+
+    all_part_filenames = [create_all_filenames(file_path, f"_{i}") for i in range(open_json(parts_file)["parts"])]
+    for i, part_filenames in enumerate(all_part_filenames):
+        graph.add(f"transcript_{i}",
+                  part_filenames.get('full_json_file'),
+                  build=partial(transcribe_part, i, part_filenames),
+                  inputs=["audio", "parts"],
+                  params={**get_transcription_params(language), "part": i},
+                  adopt_existing=True,
+                  )
+    graph.add("full_text",
+              full_text_file,
+              build=partial(save_full_text_from_all_parts, all_part_filenames, full_text_file),
+              inputs=[f"transcript_{i}" for i in range(len(all_part_filenames))],
+              )
+
+    post_processing_jobs = {}
+    # CPU-bound post-processing of part N runs in the pool while part N+1 is being transcribed
+    with ProcessPoolExecutor() as executor:
+        for i, part_filenames in enumerate(all_part_filenames):
             try:
-                raw_transcript = raw_transcript.with_name(raw_transcript.stem + f"_{i}").with_suffix('.txt')
-                new_filenames = create_all_filenames(
-                        file_path, f"_{i}"
-                        )
-                new_save_path = get_save_path_from_existing_file(audio_part)
-                transcript = run_transcript(new_save_path,
-                                            current_status,
-                                            language,
-                                            new_filenames.get('raw_transcript_file'),
-                                            )
-                transcript_part.append(transcript)
-
-                save_transcript_to_files(transcript, new_filenames)
+                graph.update([f"transcript_{i}"], force=force_transcription)
+                post_processing_jobs[i] = executor.submit(post_process_transcript, part_filenames)
             except Exception as e:
                 console.log(e, style='error')
                 continue
-        transcript_text = " ".join(trans.text for trans in transcript_part)
-        save_transcript(transcript_text,
-                        raw_transcript.with_name(raw_transcript.stem + f"_full_text_from_all_parts").with_suffix('.txt')
-                        )
-    else:
-        transcript = run_transcript(file_path, current_status, language, raw_transcript)
-        save_transcript_to_files(transcript, all_filenames)
+        with Status("Waiting for post-processing of all parts...") as current_status:
+            gather_post_processing_results(post_processing_jobs)
+    try:
+        graph.update(["full_text"])
+    except Exception as e:
+        console.log(e, style='error')
+    add_to_transcript_index(file_path.parent, [part_filenames.get('json_file') for part_filenames in all_part_filenames])
 
 
-def run_transcript(file_path, current_status, language, raw_transcript_file):
-    if not check_file_exists(raw_transcript_file):
-        with Status("Generating Transcript") as current_status:
-            return transcribe_audio(file_path, current_status, language, raw_transcript_file)
-    else:
-        transcript = eval(raw_transcript_file.read_text(encoding='utf-8'))
+def save_parts_file_from_transcripts(file_path: Path, parts_file):
+    # split audio transcribed before the parts file existed: the durations of the part transcripts give the
+    # part boundaries, so the audio does not have to be decoded and split just to adopt them
+    part_lengths_ms = []
+    while (full_json_file := create_all_filenames(file_path, f"_{len(part_lengths_ms)}").get('full_json_file')).exists():
+        try:
+            duration = getattr(load_transcript(full_json_file), "duration", None)
+        except (OSError, ValueError) as e:
+            console.log(e, style='error')
+            return False
+        if duration is None:
+            return False
+        part_lengths_ms.append(round(float(duration) * 1000))
+    if not part_lengths_ms:
+        return False
+    console.print(f"Deriving {parts_file.name} from {len(part_lengths_ms)} existing part transcripts")
+    save_json({
+        "parts": len(part_lengths_ms),
+        "part_lengths_ms": part_lengths_ms,
+        "split_parameters": SPLIT_PARAMETERS,
+        }, parts_file)
+    return True
+
+
+def transcribe_to_file(audio_file, language, all_filenames):
+    with Status("Generating Transcript") as current_status:
+        transcript = transcribe_audio(audio_file, current_status, language)
+    if transcript is None:
+        raise RuntimeError(f"Transcription for {all_filenames.get('full_json_file').name} failed")
+    save_json(transcript.json(), all_filenames.get('full_json_file'))
 
 
-def save_transcript_to_files(transcript, all_filenames):
+def get_transcription_params(language):
+    return {
+        "model": TRANSCRIPTION_MODEL,
+        "language": language,
+        "prompt": get_transcription_prompt(language),
+        }
 
-    with Status("Saving transcript...") as current_status:
-        save_json(transcript.json(), all_filenames.get('full_json_file'))
-        save_transcript(str(transcript), all_filenames.get('raw_transcript_file'))
-        save_transcript(str(transcript.text), all_filenames.get('text_only_file'))
-        save_json(transcript.words, all_filenames.get('json_file'))
 
-    with Status("Processing transcript to srt...") as current_status:
-        srt_content = create_srt(transcript.words)
-        transformed_transcript = process_json_to_transcription(transcript.words)
-        save_transcript(srt.compose(srt_content, reindex=False, in_place=True), all_filenames.get('srt_file_path'))
-        save_transcript(transformed_transcript[1], all_filenames.get('srt_as_txt_file'))
+def create_artifact_graph(all_filenames):
+    """Declare the output files derived from the full transcript.
+
+    Args:
+        all_filenames (dict): The output file names as returned by ``create_all_filenames``.
+
+    Returns:
+        ArtifactGraph: The graph with the full transcript as source and the output files built from it.
+    """
+    graph = ArtifactGraph()
+    graph.add_source("transcript", all_filenames.get('full_json_file'))
+    graph.add("raw_transcript",
+              all_filenames.get('raw_transcript_file'),
+              build=partial(save_raw_transcript_file, all_filenames),
+              inputs=["transcript"],
+              )
+    graph.add("text_only",
+              all_filenames.get('text_only_file'),
+              build=partial(save_text_only_file, all_filenames),
+              inputs=["transcript"],
+              )
+    graph.add("words",
+              all_filenames.get('json_file'),
+              build=partial(save_words_file, all_filenames),
+              inputs=["transcript"],
+              )
+    graph.add("srt",
+              all_filenames.get('srt_file_path'),
+              build=partial(save_srt_file, all_filenames),
+              inputs=["words"],
+              version=SRT_VERSION,
+              )
+    graph.add("srt_as_text",
+              all_filenames.get('srt_as_txt_file'),
+              build=partial(save_srt_as_text_file, all_filenames),
+              inputs=["words"],
+              version=SRT_VERSION,
+              )
+    graph.add("more_words_srt",
+              all_filenames.get('more_words_srt_file'),
+              build=partial(word_grouping, all_filenames.get('text_only_file'), all_filenames.get('json_file')),
+              inputs=["text_only", "words"],
+              version=WORD_GROUPING_VERSION,
+              )
+    return graph
+
+
+def post_process_transcript(all_filenames, status=None):
+    # status is None when running in a worker process of the post-processing pool
+    return create_artifact_graph(all_filenames).update(status=status)
+
+
+def gather_post_processing_results(post_processing_jobs):
+    results = {}
+    for part_number, job in post_processing_jobs.items():
         try:
-            current_status.update("Generating word_wise_transcript...")
-            word_grouping(all_filenames.get('text_only_file'), all_filenames.get('json_file'), status=current_status)
+            results[part_number] = job.result()
         except Exception as e:
-            console.log(e, style='error')
+            console.log(f"Post-processing of part {part_number} failed: {e}", style='error')
+    console.print(f"Post-processed {len(results)}/{len(post_processing_jobs)} parts")
+    return results
+
+
+def add_to_transcript_index(folder, word_files):
+    # only folders indexed with whisper-transcript-index before are kept up to date
+    index_path = find_index(folder)
+    if index_path is None:
+        return
+    try:
+        with Status("Updating transcript index...") as current_status:
+            update_index(index_path, [file for file in word_files if Path(file).exists()], status=current_status)
+    except Exception as e:
+        console.log(e, style='error')
+
+
+def load_transcript(full_json_file) -> Transcription:
+    transcript_json = open_json(full_json_file)
+    # the full transcript is saved as the json string returned by transcript.json()
+    if isinstance(transcript_json, str):
+        transcript_json = json.loads(transcript_json)
+    return Transcription.construct(**transcript_json)
+
+
+def save_raw_transcript_file(all_filenames):
+    transcript = load_transcript(all_filenames.get('full_json_file'))
+    save_transcript(str(transcript), all_filenames.get('raw_transcript_file'))
+
+
+def save_text_only_file(all_filenames):
+    transcript = load_transcript(all_filenames.get('full_json_file'))
+    save_transcript(str(transcript.text), all_filenames.get('text_only_file'))
+
+
+def save_words_file(all_filenames):
+    transcript = load_transcript(all_filenames.get('full_json_file'))
+    save_json(transcript.words, all_filenames.get('json_file'))
+
+
+def save_srt_file(all_filenames):
+    srt_content = create_srt(open_json(all_filenames.get('json_file')))
+    save_transcript(srt.compose(srt_content, reindex=False, in_place=True), all_filenames.get('srt_file_path'))
+
+
+def save_srt_as_text_file(all_filenames):
+    transformed_transcript = process_json_to_transcription(open_json(all_filenames.get('json_file')))
+    # process_json_to_transcription returns the input as string instead of the srt and txt lines on errors
+    if not isinstance(transformed_transcript, list):
+        raise ValueError(f"Could not convert {all_filenames.get('json_file').name} to srt as text")
+    save_transcript(transformed_transcript[1], all_filenames.get('srt_as_txt_file'))
+
+
+def save_full_text_from_all_parts(all_part_filenames, full_text_file):
+    transcript_text = " ".join(load_transcript(part_filenames.get('full_json_file')).text
+                               for part_filenames in all_part_filenames)
+    save_transcript(transcript_text, full_text_file)
 
 
 def create_all_filenames(file_path, part_number=''):
@@ -156,6 +377,9 @@ def create_all_filenames(file_path, part_number=''):
         "srt_file_path": generate_file_name(file_path,
                                             suffix='.srt',
                                             additional_text=f'wordwise{part_number}', ),
+        "more_words_srt_file": generate_file_name(file_path,
+                                                  suffix='.srt',
+                                                  additional_text=f'only_text{part_number}_more_words', ),
         }
 
 
@@ -168,7 +392,7 @@ def get_downloads_folder() -> Path:
     return Path(downloads_path) / "Audio"
 
 
-def transcribe_audio(audio_file, current_status, language, raw_transcript_file) -> Transcription:
+def transcribe_audio(audio_file, current_status, language) -> Transcription:
 
     openai_aip_key = get_api_key()
     current_status.update("Got API key")
@@ -177,26 +401,30 @@ def transcribe_audio(audio_file, current_status, language, raw_transcript_file)
             )
     current_status.update("Got Client")
 
-    prompt = "Hi, wir sind Nico und Vroni von salala.de und bei uns dreht sich alles um Low Carb und Keto. Und ja ähm heute machen wir äh ein hm, lass mich überlegen, ja genau ein neues Rezept. Ob zuckerfrei backen mit Erythrit und Allulose oder öhm doch kochen siehst du dann."
 
     try:
         current_status.update("Transcribing audio...")
         transcript = client.audio.transcriptions.create(
-                model="whisper-1",
+                model=TRANSCRIPTION_MODEL,
                 file=audio_file,
                 language=language,
                 # response_format="srt",
                 response_format="verbose_json",
                 timestamp_granularities=["word"],
-                prompt=prompt if language == "de" else "Hi there",
+                prompt=get_transcription_prompt(language),
                 )
         current_status.update("Transcript Done")
-        save_transcript(str(transcript), raw_transcript_file)
         return transcript
     except Exception as e:
         console.log(e, style='error')
 
 
+def get_transcription_prompt(language):
+    if language != "de":
+        return "Hi there"
+    return "Hi, wir sind Nico und Vroni von salala.de und bei uns dreht sich alles um Low Carb und Keto. Und ja ähm heute machen wir äh ein hm, lass mich überlegen, ja genau ein neues Rezept. Ob zuckerfrei backen mit Erythrit und Allulose oder öhm doch kochen siehst du dann."
+
+
 def get_api_key():
     openai_api_key = None
     try:
@@ -212,28 +440,25 @@ def get_api_key():
         sys.exit(f"{e}")
 
 
-def get_save_path_from_existing_file(audio_file):
-    transcript_path = Path(audio_file).parent / Path(audio_file).name
-    return transcript_path
-
-
+# the output files are built by the artifact graph, which must not record a fingerprint for a failed write,
+# so both helpers re-raise after logging and never leave a partly written file behind
 def save_json(transcript, save_path):
     try:
-        with open(save_path, "w", encoding="utf-8") as file:
+        with atomic_write(save_path) as file:
             json.dump(transcript, file, ensure_ascii=False, indent=4, sort_keys=True)
     except Exception as e:
         console.print(e, style='error')
-        return
+        raise
 
 
 def save_transcript(transcription, file_path_to_save):
     console.print(f"Saving file: {file_path_to_save.name}")
     try:
-        with open(file_path_to_save, "w", encoding="utf-8") as file:
+        with atomic_write(file_path_to_save) as file:
             file.write(transcription)
     except Exception as e:
         console.log(e, style='error')
-        return
+        raise
 
 
 def generate_file_name(filepath: Path, /, suffix: str, additional_text: str = None):
@@ -249,7 +474,7 @@ def generate_file_name(filepath: Path, /, suffix: str, additional_text: str = No
 
 
 def open_json(json_file_path):
-    with open(json_file_path, "r") as file:
+    with open(json_file_path, "r", encoding="utf-8") as file:
         return json.load(file)
 
 
@@ -0,0 +1,139 @@
+import os
+
+import pytest
+
+from whisper_transcribe.helpers.artifact_graph import ArtifactGraph, atomic_write, get_fingerprint_path
+
+
+@pytest.fixture
+def source(tmp_path):
+    source_path = tmp_path / "source.txt"
+    source_path.write_text("hello", encoding="utf-8")
+    return source_path
+
+
+def create_graph(tmp_path, source, builds, params=None, version="1", adopt_existing=False):
+    def build_upper():
+        builds.append("upper")
+        (tmp_path / "upper.txt").write_text(source.read_text(encoding="utf-8").upper(), encoding="utf-8")
+
+    def build_shout():
+        builds.append("shout")
+        (tmp_path / "shout.txt").write_text((tmp_path / "upper.txt").read_text(encoding="utf-8") + "!",
+                                            encoding="utf-8")
+
+    graph = ArtifactGraph()
+    graph.add_source("source", source)
+    graph.add("upper", tmp_path / "upper.txt", build=build_upper, inputs=["source"], adopt_existing=adopt_existing)
+    graph.add("shout", tmp_path / "shout.txt", build=build_shout, inputs=["upper"], params=params, version=version)
+    return graph
+
+
+def touch(file_path):
+    stat = file_path.stat()
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_first_update_builds_everything_and_records_fingerprints(tmp_path, source):
+    builds = []
+    assert create_graph(tmp_path, source, builds).update() == ["upper", "shout"]
+    assert (tmp_path / "shout.txt").read_text(encoding="utf-8") == "HELLO!"
+    assert get_fingerprint_path(tmp_path / "upper.txt").exists()
+    assert get_fingerprint_path(tmp_path / "shout.txt").exists()
+
+
+def test_second_update_rebuilds_nothing(tmp_path, source):
+    create_graph(tmp_path, source, []).update()
+    builds = []
+    assert create_graph(tmp_path, source, builds).update() == []
+    assert builds == []
+
+
+def test_changed_input_rebuilds_dependents(tmp_path, source):
+    create_graph(tmp_path, source, []).update()
+    source.write_text("bye", encoding="utf-8")
+    assert create_graph(tmp_path, source, []).update() == ["upper", "shout"]
+    assert (tmp_path / "shout.txt").read_text(encoding="utf-8") == "BYE!"
+
+
+def test_touched_input_with_same_content_is_not_stale(tmp_path, source):
+    create_graph(tmp_path, source, []).update()
+    touch(source)
+    assert create_graph(tmp_path, source, []).update() == []
+
+
+def test_rebuild_with_same_content_does_not_invalidate_dependents(tmp_path, source):
+    create_graph(tmp_path, source, []).update()
+    source.write_text("HELLO", encoding="utf-8")
+    assert create_graph(tmp_path, source, []).update() == ["upper"]
+
+
+@pytest.mark.parametrize("changes", [{"params": {"group_size": 4}}, {"version": "2"}])
+def test_changed_params_or_version_rebuild_only_that_artifact(tmp_path, source, changes):
+    create_graph(tmp_path, source, []).update()
+    assert create_graph(tmp_path, source, [], **changes).update() == ["shout"]
+
+
+def test_missing_fingerprint_or_output_is_stale(tmp_path, source):
+    create_graph(tmp_path, source, []).update()
+    get_fingerprint_path(tmp_path / "shout.txt").unlink()
+    assert create_graph(tmp_path, source, []).is_stale("shout")
+    (tmp_path / "shout.txt").unlink()
+    assert create_graph(tmp_path, source, []).update() == ["shout"]
+
+
+def test_edited_output_is_stale(tmp_path, source):
+    create_graph(tmp_path, source, []).update()
+    (tmp_path / "shout.txt").write_text("edited", encoding="utf-8")
+    assert create_graph(tmp_path, source, []).update() == ["shout"]
+
+
+def test_existing_artifact_without_fingerprint_is_adopted(tmp_path, source):
+    (tmp_path / "upper.txt").write_text("ADOPTED", encoding="utf-8")
+    builds = []
+    assert create_graph(tmp_path, source, builds, adopt_existing=True).update() == ["shout"]
+    assert builds == ["shout"]
+    assert (tmp_path / "upper.txt").read_text(encoding="utf-8") == "ADOPTED"
+    assert not create_graph(tmp_path, source, [], adopt_existing=True).is_stale("upper")
+
+
+def test_force_rebuilds_only_the_targets(tmp_path, source):
+    create_graph(tmp_path, source, []).update()
+    builds = []
+    assert create_graph(tmp_path, source, builds).update(["shout"], force=True) == ["shout"]
+    assert builds == ["shout"]
+
+
+def test_undeclared_input_raises(tmp_path):
+    with pytest.raises(ValueError):
+        ArtifactGraph().add("output", tmp_path / "output.txt", build=lambda: None, inputs=["missing"])
+
+
+def test_failed_build_records_no_fingerprint(tmp_path, source):
+    def build_failing():
+        with atomic_write(tmp_path / "failing.txt") as file:
+            file.write("half")
+            raise TypeError("not serializable")
+
+    graph = ArtifactGraph()
+    graph.add_source("source", source)
+    graph.add("failing", tmp_path / "failing.txt", build=build_failing, inputs=["source"])
+    with pytest.raises(TypeError):
+        graph.update()
+    assert not (tmp_path / "failing.txt").exists()
+    assert not get_fingerprint_path(tmp_path / "failing.txt").exists()
+    assert graph.is_stale("failing")
+
+
+def test_atomic_write_keeps_the_old_file_on_errors(tmp_path):
+    file_path = tmp_path / "output.txt"
+    file_path.write_text("old", encoding="utf-8")
+    with pytest.raises(ValueError):
+        with atomic_write(file_path) as file:
+            file.write("new")
+            raise ValueError
+    assert file_path.read_text(encoding="utf-8") == "old"
+    assert list(tmp_path.iterdir()) == [file_path]
+    with atomic_write(file_path) as file:
+        file.write("new")
+    assert file_path.read_text(encoding="utf-8") == "new"
@@ -0,0 +1,46 @@
+import pytest
+
+from whisper_transcribe.helpers.chunk_buffer import ChunkBuffer
+
+
+class FakeAudioSegment:
+    def __init__(self, size):
+        self.size = size
+
+    def export(self, out_f, format):
+        out_f.write(b"x" * self.size)
+        out_f.seek(0)
+
+
+def test_chunk_buffer_holds_the_encoded_audio():
+    with ChunkBuffer.from_audio_segment(FakeAudioSegment(500), "part0.mp3") as buffer:
+        assert buffer.size == 500
+        assert not buffer.spilled
+        name, file = buffer.as_upload()
+        assert name == "part0.mp3"
+        assert file.read() == b"x" * 500
+        # every upload starts at the beginning of the buffer
+        assert buffer.as_upload()[1].read() == b"x" * 500
+
+
+def test_chunk_buffer_spills_to_disk_above_threshold():
+    with ChunkBuffer.from_audio_segment(FakeAudioSegment(500), "part0.mp3", spill_threshold=100) as buffer:
+        assert buffer.spilled
+
+
+def test_chunk_buffer_is_closed_after_use():
+    with ChunkBuffer.from_audio_segment(FakeAudioSegment(500), "part0.mp3") as buffer:
+        file = buffer.as_upload()[1]
+    assert file.closed
+
+
+def test_chunk_buffer_is_closed_when_encoding_fails():
+    class FailingAudioSegment:
+        def export(self, out_f, format):
+            self.file = out_f
+            raise RuntimeError("ffmpeg failed")
+
+    segment = FailingAudioSegment()
+    with pytest.raises(RuntimeError):
+        ChunkBuffer.from_audio_segment(segment, "part0.mp3")
+    assert segment.file.closed
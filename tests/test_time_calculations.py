@@ -0,0 +1,13 @@
+import pytest
+
+from whisper_transcribe.helpers.time_calculations import seconds_to_timestamp
+
+
+@pytest.mark.parametrize("seconds, timestamp", [
+    (0, "00:00:00.000"),
+    (2.5, "00:00:02.500"),
+    (59.9996, "00:01:00.000"),
+    (3725.5, "01:02:05.500"),
+    ])
+def test_seconds_to_timestamp(seconds, timestamp):
+    assert seconds_to_timestamp(seconds) == timestamp
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from whisper_transcribe.helpers import transcript_index
+from whisper_transcribe.helpers.transcript_index import (INDEX_FILE_NAME, find_index, find_phrase, search_index,
+                                                         tokenize, update_index, update_index_from_folder)
+
+TEXT = "Heute backen wir mit Erythrit und Low-Carb Mehl, genau mit Erythrit"
+
+
+def save_word_file(file_path, text=TEXT):
+    words = [{"word": word, "start": i * 0.5, "end": i * 0.5 + 0.4} for i, word in enumerate(text.split())]
+    file_path.write_text(json.dumps(words), encoding="utf-8")
+    return file_path
+
+
+@pytest.fixture
+def folder(tmp_path):
+    (tmp_path / "episodes").mkdir()
+    save_word_file(tmp_path / "episodes" / "episode.json")
+    # files without word timestamps are skipped
+    (tmp_path / "episodes" / "episode_full_transcript.json").write_text(json.dumps('{"text": "Erythrit"}'),
+                                                                         encoding="utf-8")
+    (tmp_path / "episodes" / "other.json").write_text(json.dumps([1, 2]), encoding="utf-8")
+    return tmp_path
+
+
+def test_tokenize_splits_like_the_index():
+    assert tokenize("Low-Carb Mehl, genau_so") == ["low", "carb", "mehl", "genau", "so"]
+
+
+def test_find_phrase_maps_tokens_back_to_words():
+    words = [[word, 0, 0] for word in TEXT.split()]
+    assert list(find_phrase(words, tokenize("mit Erythrit"))) == [(3, 4), (9, 10)]
+    # the phrase ends in the middle of the hyphenated word
+    assert list(find_phrase(words, tokenize("und low"))) == [(5, 6)]
+    assert list(find_phrase(words, tokenize("erythrit zucker"))) == []
+
+
+def test_search_returns_file_timestamps_and_context(folder):
+    assert update_index_from_folder(folder) == (1, 0)
+    hits = search_index(folder / INDEX_FILE_NAME, "Low Carb Mehl", context_words=1)
+    assert hits == [{
+        "file": (folder / "episodes" / "episode.json").resolve(),
+        "episode": "episode",
+        "start": 3.0,
+        "end": 3.9,
+        "context": "und Low-Carb Mehl, genau",
+        }]
+
+
+def test_search_finds_every_occurrence(folder):
+    update_index_from_folder(folder)
+    hits = search_index(folder / INDEX_FILE_NAME, "erythrit")
+    assert [hit["start"] for hit in hits] == [2.0, 5.0]
+    assert search_index(folder / INDEX_FILE_NAME, "zucker") == []
+    assert search_index(folder / INDEX_FILE_NAME, '"') == []
+
+
+def test_update_index_skips_unchanged_files(folder, monkeypatch):
+    update_index_from_folder(folder)
+    read_files = []
+    original_read_word_file = transcript_index.read_word_file
+    monkeypatch.setattr(transcript_index, "read_word_file",
+                        lambda file_path: read_files.append(file_path.name) or original_read_word_file(file_path))
+
+    assert update_index_from_folder(folder) == (0, 0)
+    assert read_files == []
+
+    save_word_file(folder / "episodes" / "episode.json", "Heute kochen wir mit Allulose")
+    save_word_file(folder / "episodes" / "new_episode.json", "Erythrit im Kuchen")
+    assert update_index(folder / INDEX_FILE_NAME, [folder / "episodes" / "episode.json",
+                                                   folder / "episodes" / "new_episode.json"]) == 2
+    assert sorted(read_files) == ["episode.json", "new_episode.json"]
+    hits = search_index(folder / INDEX_FILE_NAME, "erythrit")
+    assert [hit["file"].name for hit in hits] == ["new_episode.json"]
+    assert len(search_index(folder / INDEX_FILE_NAME, "allulose")) == 1
+
+
+def test_removed_files_are_dropped_from_the_index(folder):
+    update_index_from_folder(folder)
+    (folder / "episodes" / "episode.json").unlink()
+    assert update_index_from_folder(folder) == (0, 1)
+    assert search_index(folder / INDEX_FILE_NAME, "erythrit") == []
+
+
+def test_find_index_looks_in_parent_folders(folder):
+    assert find_index(folder / "episodes") is None
+    update_index_from_folder(folder)
+    assert find_index(folder / "episodes") == (folder / INDEX_FILE_NAME).resolve()
+
+
+def test_part_times_are_shifted_to_the_episode(folder):
+    save_word_file(folder / "episodes" / "long_episode__0.json", "Heute backen wir")
+    save_word_file(folder / "episodes" / "long_episode__1.json", "mit Erythrit und Allulose")
+    (folder / "episodes" / "long_episode_parts.json").write_text(
+            json.dumps({"parts": 2, "part_lengths_ms": [480_500, 300_000]}), encoding="utf-8")
+    update_index_from_folder(folder)
+    hits = search_index(folder / INDEX_FILE_NAME, "erythrit und allulose")
+    assert len(hits) == 1
+    assert hits[0]["file"].name == "long_episode__1.json"
+    assert hits[0]["episode"] == "long_episode"
+    assert hits[0]["start"] == pytest.approx(480.5 + 0.5)
+    assert hits[0]["end"] == pytest.approx(480.5 + 1.9)
+    assert search_index(folder / INDEX_FILE_NAME, "backen")[0]["start"] == pytest.approx(0.5)
+
+    # a new split changes the offsets even if the word files stay the same
+    (folder / "episodes" / "long_episode_parts.json").write_text(
+            json.dumps({"parts": 2, "part_lengths_ms": [400_000, 380_500]}), encoding="utf-8")
+    assert update_index_from_folder(folder) == (1, 0)
+    assert search_index(folder / INDEX_FILE_NAME, "allulose")[0]["start"] == pytest.approx(401.5)